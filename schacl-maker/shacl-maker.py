@@ -1,9 +1,10 @@
-from typing import Dict, Set, List
+from collections import defaultdict
+from functools import lru_cache, partial
+from typing import Dict, List, Set, Union
 import typer
 
-import pandas as pd
-import csv
 from rdflib import (
+    BNode,
     Graph,
     Literal,
     RDF,
@@ -13,8 +14,9 @@ from rdflib import (
     SH,
     RDFS,
 )
+from rdflib.collection import Collection
 import os
-import yaml
+import re
 from urllib.parse import quote
 
 shapes_graph = Graph()
@@ -22,6 +24,7 @@ shapes_graph = Graph()
 # Prefixes used throughout the script
 ODTP = Namespace("https://odtp.example.org/components/data/")
 shapes_graph.bind("odtp", ODTP)
+ODTP_STR = str(ODTP)
 
 SD = Namespace("https://w3id.org/okn/o/sd#")
 shapes_graph.bind("SD", SD)
@@ -29,10 +32,103 @@ shapes_graph.bind("SD", SD)
 SKOS = Namespace("http://www.w3.org/2004/02/skos/core#")
 shapes_graph.bind("skos", SKOS)
 
+# Terms reused for every row
+RDF_TYPE = RDF.type
+RDFS_SUBCLASSOF = RDFS.subClassOf
+XSD_STRING = XSD.string
+SH_NODESHAPE = SH.NodeShape
+SH_PROPERTYSHAPE = SH.PropertyShape
+SH_TARGETNODE = SH.targetNode
+SH_DESCRIPTION = SH.description
+SH_DATATYPE = SH.datatype
+SH_NAME = SH.name
+SH_PATH = SH.path
+SH_HASVALUE = SH.hasValue
+SH_AND = SH["and"]
+SD_HASPARAMETER = SD.hasParameter
+ODTP_INPUTFILE = ODTP.InputFile
+SKOS_EXAMPLE = SKOS.example
+SKOS_ALTLABEL = SKOS.altLabel
+
+# Descriptions are typed as xsd:string
+string_literal = partial(Literal, datatype=XSD_STRING)
+
+# Conservative subset of Turtle's PN_LOCAL; other local names are written as <iri>
+PN_LOCAL = re.compile(r"[A-Za-z_][A-Za-z0-9_-]*")
+
+# Columns expected in the input file
+COLUMNS = (
+    "file_relative_path",
+    "file_description",
+    "variable_name",
+    "variable_alternative_labels",
+    "variable_description",
+    "variable_value_example",
+    "variable_type",
+)
+
+
+@lru_cache(maxsize=None)
+def variable_path_uri(variable_name: str) -> URIRef:
+    """Returns the ODTP URI of a variable, shared by every file that uses it.
+
+    Parameters
+    ----------
+    variable_name : str
+        Name of the variable.
+
+    Returns
+    -------
+    URIRef
+        URI of the variable in the ODTP namespace.
+    """
+    return URIRef(f"{ODTP_STR}{variable_name}")
+
+
+@lru_cache(maxsize=None)
+def variable_shape_uri(variable_name: str) -> URIRef:
+    """Returns the URI of a variable's property shape.
+
+    Parameters
+    ----------
+    variable_name : str
+        Name of the variable.
+
+    Returns
+    -------
+    URIRef
+        URI of the property shape in the ODTP namespace.
+    """
+    return URIRef(f"{ODTP_STR}{variable_name}Shape")
+
+
+def split_labels(labels: Union[str, List[str], None]) -> List[str]:
+    """Normalizes alternative labels into a list of strings.
+
+    Parameters
+    ----------
+    labels : Union[str, List[str], None]
+        Alternative labels, as a list or a comma-separated string.
+
+    Returns
+    -------
+    List[str]
+        The labels with surrounding whitespace stripped and empty ones dropped.
+    """
+    if labels is None:
+        return []
+    if not isinstance(labels, list):
+        labels = str(labels).split(",")
+    items = (str(item).strip() for item in labels if item is not None)
+    return [label for label in items if label]
+
 
 def read_and_process_file(filename: str) -> Dict[str, Set[str]]:
     """Reads the CSV or YAML file and processes the data.
 
+    The shape triples of every row and the sh:and list of parameter
+    constraints of every file are added to the graph in the same pass.
+
     Parameters
     ----------
     filename : str
@@ -43,63 +139,124 @@ def read_and_process_file(filename: str) -> Dict[str, Set[str]]:
     Dict[str, Set[str]]
         A dictionary containing file paths as keys and sets of variable names as values.
     """
-    with open(filename, "r") as file:
-        file_extension = os.path.splitext(file.name)[1]
-        if file_extension == ".csv":
-            reader = csv.DictReader(file)
-        elif file_extension == ".yml":
-            reader = yaml.safe_load(file)
-        else:
-            raise ValueError(f"Unsupported file type: {file_extension}")
-
-        files_variables = {}
-
-        for row in reader:
-            file_relative_path = row["file_relative_path"]
-            file_description = row["file_description"]
-            variable_name = row["variable_name"]
-            variable_alternative_labels = row["variable_alternative_labels"]
-            variable_description = row["variable_description"]
-            variable_value_example = row["variable_value_example"]
-            variable_type = row["variable_type"]
-
-            if file_relative_path not in files_variables:
-                files_variables[file_relative_path] = set()
-            files_variables[file_relative_path].add(variable_name)
-
-            create_triples(
-                file_relative_path,
-                file_description,
-                variable_name,
-                variable_alternative_labels,
-                variable_description,
-                variable_value_example,
-                variable_type,
+    file_extension = os.path.splitext(filename)[1]
+    # pandas and yaml are only imported for the format that needs them
+    if file_extension == ".csv" and os.path.getsize(filename) == 0:
+        # an empty CSV has no rows, and a 0-byte file cannot be memory-mapped
+        rows = []
+    elif file_extension == ".csv":
+        import pandas as pd
+
+        # memory-map the file so the C tokenizer scans it without a Python buffer
+        df = pd.read_csv(
+            filename,
+            dtype=str,
+            keep_default_na=False,
+            na_filter=False,
+            memory_map=True,
+        )
+        labels = df["variable_alternative_labels"]
+        df["variable_alternative_labels"] = labels.map(split_labels)
+        rows = df[list(COLUMNS)].itertuples(index=False, name=None)
+    elif file_extension == ".yml":
+        import yaml
+
+        # prefer the libyaml-based loader, which parses in C
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+        with open(filename, "r", encoding="utf-8") as file:
+            records = yaml.load(file, Loader=loader)
+        # labels may be given as a list or, as in the CSV, comma-separated
+        for record in records:
+            labels = record["variable_alternative_labels"]
+            record["variable_alternative_labels"] = split_labels(labels)
+        rows = [[record[column] for column in COLUMNS] for record in records]
+    else:
+        raise ValueError(f"Unsupported file type: {file_extension}")
+
+    g = shapes_graph
+    files_variables = defaultdict(set)
+    file_uris = {}
+    file_constraints = defaultdict(list)
+
+    for (
+        file_relative_path,
+        file_description,
+        variable_name,
+        variable_alternative_labels,
+        variable_description,
+        variable_value_example,
+        variable_type,
+    ) in rows:
+        file_uri = file_uris.get(file_relative_path)
+        if file_uri is None:
+            file_uri = ODTP[quote(file_relative_path)]
+            file_uris[file_relative_path] = file_uri
+            create_file_triples(file_uri, file_description)
+
+        variables = files_variables[file_relative_path]
+        if variable_name not in variables:
+            variables.add(variable_name)
+            constraint = BNode()
+            g.addN(
+                [
+                    (constraint, SH_PATH, SD_HASPARAMETER, g),
+                    (constraint, SH_HASVALUE, variable_path_uri(variable_name), g),
+                ]
             )
+            file_constraints[file_relative_path].append(constraint)
+
+        create_variable_triples(
+            variable_name,
+            variable_alternative_labels,
+            variable_description,
+            variable_value_example,
+            variable_type,
+        )
+
+    # close each file's parameter constraints into its sh:and list
+    for file_relative_path, constraints in file_constraints.items():
+        andlist = BNode()
+        Collection(g, andlist, constraints)
+        g.add((file_uris[file_relative_path], SH_AND, andlist))
+
+    return dict(files_variables)
 
-    return files_variables
+
+def create_file_triples(file_uri: URIRef, file_description: str) -> None:
+    """Creates the node shape triples for a file.
+
+    Parameters
+    ----------
+    file_uri : URIRef
+        URI of the file node shape.
+    file_description : str
+        Description of the file.
+    """
+    g = shapes_graph
+    g.addN(
+        [
+            (file_uri, RDF_TYPE, SH_NODESHAPE, g),
+            (file_uri, RDFS_SUBCLASSOF, ODTP_INPUTFILE, g),
+            (file_uri, SH_TARGETNODE, file_uri, g),
+            (file_uri, SH_DESCRIPTION, string_literal(file_description), g),
+        ]
+    )
 
 
-def create_triples(
-    file_relative_path: str,
-    file_description: str,
+def create_variable_triples(
     variable_name: str,
-    variable_alternative_labels: str,
+    variable_alternative_labels: List[str],
     variable_description: str,
     variable_value_example: str,
     variable_type: str,
 ) -> None:
-    """Creates triples for file and variable metadata.
+    """Creates the property shape triples for a variable.
 
     Parameters
     ----------
-    file_relative_path : str
-        Relative path of the file.
-    file_description : str
-        Description of the file.
     variable_name : str
         Name of the variable.
-    variable_alternative_labels : str
+    variable_alternative_labels : List[str]
         Alternative labels for the variable.
     variable_description : str
         Description of the variable.
@@ -108,91 +265,95 @@ def create_triples(
     variable_type : str
         Type of the variable.
     """
-    file_uri = ODTP[quote(file_relative_path)]
-
-    variable_uri = URIRef(ODTP + variable_name + "Shape")
-
-    # nodeshapes (for restricting files)
-    shapes_graph.add((file_uri, RDF.type, SH.NodeShape))
-    shapes_graph.add((file_uri, RDFS.subClassOf, ODTP.InputFile))
-    shapes_graph.add((file_uri, SH.targetNode, file_uri))
-    shapes_graph.add(
-        (file_uri, SH.description, Literal(file_description, datatype=XSD.string))
+    variable_uri = variable_shape_uri(variable_name)
+
+    g = shapes_graph
+    quads = [
+        (variable_uri, RDF_TYPE, SH_PROPERTYSHAPE, g),
+        (variable_uri, SH_DATATYPE, URIRef(variable_type), g),
+        (variable_uri, SH_DESCRIPTION, string_literal(variable_description), g),
+        (variable_uri, SH_NAME, Literal(variable_name), g),
+        (variable_uri, SH_PATH, variable_path_uri(variable_name), g),
+        (variable_uri, SKOS_EXAMPLE, Literal(variable_value_example), g),
+    ]
+    quads.extend(
+        (variable_uri, SKOS_ALTLABEL, label, g)
+        for label in map(Literal, variable_alternative_labels)
     )
+    g.addN(quads)
 
-    # propertyshapes (for restricting variables)
-    shapes_graph.add((variable_uri, RDF.type, SH.PropertyShape))
-    shapes_graph.add((variable_uri, SH.datatype, URIRef(variable_type)))
-    shapes_graph.add(
-        (
-            variable_uri,
-            SH.description,
-            Literal(variable_description, datatype=XSD.string),
-        )
-    )
-    shapes_graph.add((variable_uri, SH.name, Literal(variable_name)))
-    shapes_graph.add((variable_uri, SH.path, URIRef(ODTP + variable_name)))
-    shapes_graph.add((variable_uri, SKOS.example, Literal(variable_value_example)))
-    shapes_graph.add(
-        (variable_uri, SKOS.altLabel, Literal(variable_alternative_labels))
-    )
 
+def write_turtle(destination: str) -> None:
+    """Writes the shapes graph as flat Turtle, one block per subject.
 
-def and_builder(variables: Dict[str, Set[str]]) -> List[str]:
-    """Constructs AND statements for the property shapes.
+    Unlike rdflib's Turtle serializer, nothing is sorted and blank nodes are
+    written with labels instead of being nested, so the output is produced in
+    a single pass over the graph.
 
     Parameters
     ----------
-    variables : Dict[str, Set[str]]
-        Dictionary containing file paths as keys and sets of variable names as values.
-
-    Returns
-    -------
-    List[str]
-        List strings containing ttl syntax nodeshapes with an sh:and.
+    destination : str
+        Path of the Turtle file to write.
     """
-    propstringlist = []
-    for var in variables:
-        propstring = ""
-        andstring = ""
-        file_uri = URIRef(ODTP + var)
-
-        for item in variables[var]:
-            blanknodeitem = f"[sh:path <https://w3id.org/okn/o/sd#hasParameter> ; sh:hasValue <https://odtp.example.org/components/data/{item}>]"
-            andstring += f" {blanknodeitem}"
+    namespaces = {
+        str(ns): prefix for prefix, ns in shapes_graph.namespace_manager.namespaces()
+    }
+    used_prefixes = {}
+
+    def turtle_term(term) -> str:
+        if isinstance(term, URIRef):
+            iri = str(term)
+            split = max(iri.rfind("#"), iri.rfind("/")) + 1
+            prefix = namespaces.get(iri[:split])
+            # only abbreviate when the local part is valid unescaped Turtle
+            if prefix is not None and PN_LOCAL.fullmatch(iri[split:]):
+                used_prefixes[prefix] = iri[:split]
+                return f"{prefix}:{iri[split:]}"
+        elif isinstance(term, Literal) and term.datatype is not None:
+            return f"{Literal(str(term)).n3()}^^{turtle_term(term.datatype)}"
+        return term.n3()
+
+    blocks = []
+    for subject in shapes_graph.subjects(unique=True):
+        predicate_objects = " ;\n    ".join(
+            f"{turtle_term(p)} {turtle_term(o)}"
+            for p, o in shapes_graph.predicate_objects(subject)
+        )
+        blocks.append(f"{turtle_term(subject)} {predicate_objects} .\n\n")
 
-        propstring = f"<{file_uri}> sh:and ({andstring}) ."
-        propstringlist.append(propstring)
-    return propstringlist
+    # only the prefixes actually used, collected once every term is written
+    prefixes = [f"@prefix {prefix}: <{ns}> .\n" for prefix, ns in used_prefixes.items()]
+    with open(destination, "w", encoding="utf-8", buffering=1 << 20) as file:
+        file.writelines(prefixes)
+        file.write("\n")
+        file.writelines(blocks)
 
 
-def main(input_filename: str) -> None:
+def main(input_filename: str, pretty: bool = True) -> None:
     """Main function to orchestrate the RDF generation process.
 
     Parameters
     ----------
     input_filename : str
         The relative path to the file containing structured information (either csv or yml).
+    pretty : bool
+        Whether to write the output with rdflib's Turtle serializer, or with
+        the faster flat writer when False.
     """
-    files_variables = read_and_process_file(input_filename)
-    shapes_graph.serialize(destination="shapeswithoutand.ttl", format="turtle")
-    with open("shapeswithoutand.ttl", "a") as file:
-        for andstatement in and_builder(files_variables):
-            file.write(andstatement + "\n")
-
-    final_graph = Graph()
-    final_graph.parse("shapeswithoutand.ttl", format="turtle")
-    final_graph.serialize(destination="finalShapes.ttl", format="turtle")
-    os.remove("shapeswithoutand.ttl")
+    read_and_process_file(input_filename)
+    if pretty:
+        shapes_graph.serialize(destination="finalShapes.ttl", format="turtle")
+    else:
+        write_turtle("finalShapes.ttl")
 
 
 app = typer.Typer()
 
 
 @app.command()
-def make_shacl(csv_file: str):
+def make_shacl(csv_file: str, pretty: bool = True):
     # Call your function here and pass the path to csv_file as input
-    main(csv_file)
+    main(csv_file, pretty)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,66 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+from rdflib import Graph
+from rdflib.compare import isomorphic
+
+SCRIPT = Path(__file__).resolve().parent.parent / "schacl-maker" / "shacl-maker.py"
+
+CSV = """\
+file_relative_path,file_description,variable_name,variable_alternative_labels,variable_description,variable_value_example,variable_type
+data/out file.csv,"Measurements
+over two lines",x(y),"t, temp",Température en °C,21.5,http://www.w3.org/2001/XMLSchema#float
+data/out file.csv,"Measurements
+over two lines",my.var.,,Trailing dot,1,http://www.w3.org/2001/XMLSchema#integer
+other.csv,Other file,1abc,a,"Says ""hi"" twice",x,http://example.org/dt#x
+"""
+
+
+def load_script():
+    """Loads a fresh copy of the script, with its own empty shapes graph."""
+    spec = importlib.util.spec_from_file_location("shacl_maker", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_shapes(tmp_path: Path, input_path: Path, pretty: bool) -> Graph:
+    """Runs main in tmp_path and parses the Turtle it writes."""
+    load_script().main(str(input_path), pretty)
+    output = tmp_path / "finalShapes.ttl"
+    # raises if the file is not valid UTF-8, whatever the locale
+    output.read_bytes().decode("utf-8")
+    return Graph().parse(output, format="turtle")
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".yml"])
+def test_flat_output_matches_pretty_output(tmp_path, monkeypatch, suffix):
+    monkeypatch.chdir(tmp_path)
+    input_path = tmp_path / "input.csv"
+    input_path.write_text(CSV, encoding="utf-8")
+    if suffix == ".yml":
+        import pandas as pd
+
+        yaml = pytest.importorskip("yaml")
+        records = pd.read_csv(input_path, dtype=str).fillna("")
+        input_path = tmp_path / "input.yml"
+        input_path.write_text(
+            yaml.safe_dump(records.to_dict("records"), allow_unicode=True),
+            encoding="utf-8",
+        )
+
+    pretty = make_shapes(tmp_path, input_path, pretty=True)
+    flat = make_shapes(tmp_path, input_path, pretty=False)
+
+    assert len(flat) > 0
+    assert isomorphic(flat, pretty)
+
+
+@pytest.mark.parametrize("pretty", [True, False])
+def test_empty_csv_writes_empty_shapes(tmp_path, monkeypatch, pretty):
+    monkeypatch.chdir(tmp_path)
+    input_path = tmp_path / "input.csv"
+    input_path.touch()
+
+    assert len(make_shapes(tmp_path, input_path, pretty)) == 0